@@ -1,17 +1,116 @@
-from datetime import datetime, time
+import asyncio
+import ipaddress
+from datetime import datetime
+from time import monotonic
+import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from database import Database
 
+# orjson parses the ip-api response ~2-3x faster than stdlib json;
+# fall back to the stdlib if it isn't installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
+
+# Optional local GeoIP database (MaxMind GeoLite2)
+# Point GEOIP_DB_PATH at a GeoLite2-Country.mmdb file to resolve countries
+# from a memory-mapped local file in microseconds instead of calling ip-api.com
+try:
+    import geoip2.database
+except ImportError:
+    geoip2 = None
+
+_GEOIP_DB_PATH = os.getenv('GEOIP_DB_PATH', 'GeoLite2-Country.mmdb')
+_GEOIP_READER = None
+if geoip2 is not None and os.path.exists(_GEOIP_DB_PATH):
+    _GEOIP_READER = geoip2.database.Reader(_GEOIP_DB_PATH)
+    print(f"✅ Using local GeoIP database: {_GEOIP_DB_PATH}")
+
+# In-process cache for IP geolocation results
+# Repeat lookups from the same IP are served from memory instead of
+# a ~100ms network round-trip to ip-api.com (which is also rate-limited)
+_GEO_CACHE = {}
+_GEO_CACHE_LOCK = threading.Lock()
+_GEO_CACHE_TTL = 24 * 3600  # Cache successful lookups for 24 hours
+_GEO_CACHE_MAX = 10000      # Bound memory usage (FIFO eviction)
+
+# Reusable results for the common static outcomes - returned by reference
+# on hot paths to avoid rebuilding identical dicts per check
+# Treat these as read-only (kept as plain dicts rather than mappingproxy
+# so they stay JSON-serializable for audit logs and API responses)
+_FILE_NOT_FOUND = {'allowed': False, 'reason': 'File not found', 'check': 'file_exists'}
+_FILE_NOT_FOUND_TIME = {'allowed': False, 'reason': 'File not found', 'check': 'time_based'}
+_FILE_NOT_FOUND_LOCATION = {'allowed': False, 'reason': 'File not found', 'check': 'location_based'}
+_USER_HAS_PERMISSION = {'allowed': True, 'reason': 'User has permission', 'check': 'user_permission'}
+
+# Parsed access-time windows, keyed by the (start, end) strings
+# Windows rarely change, so each distinct pair is parsed only once
+_TIME_WINDOW_CACHE = {}
+
+# Fast verifier closures specialized per ACL, keyed by the ACL contents
+# themselves - a changed ACL is simply a new key, so no explicit
+# invalidation is needed
+_VERIFIER_CACHE = {}
+_VERIFIER_CACHE_MAX = 4096
+
+
+def _parse_window(value: str) -> int:
+    """Convert an 'HH:MM' string to minutes since midnight"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+# Shared HTTP session so geolocation lookups reuse keep-alive connections
+# instead of paying TCP handshake cost on every call
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+
+
 class AccessControl:
     """
     Zero-Trust Access Control System
     Verifies: Who, When, and Where before granting access
     """
     
+    # Shared Database instance - constructing Database touches the
+    # filesystem, so every AccessControl() reuses one lazily-built handle
+    _db = None
+
     def __init__(self):
-        """Initialize access control with database"""
-        self.db = Database()
-    
+        """Initialize access control with a shared database handle"""
+        self.db = self._get_db()
+
+    @classmethod
+    def _get_db(cls):
+        """Build the shared Database instance on first use"""
+        if cls._db is None:
+            cls._db = Database()
+        return cls._db
+
+
+    @staticmethod
+    def _normalize_meta(file_meta: dict) -> dict:
+        """
+        Convert ACL lists to frozensets so membership checks are O(1)
+
+        Safe to do in place - the database returns a fresh dict per read.
+        """
+        if file_meta:
+            if not isinstance(file_meta.get('allowed_users'), frozenset):
+                file_meta['allowed_users'] = frozenset(file_meta.get('allowed_users', ()))
+            if not isinstance(file_meta.get('allowed_regions'), frozenset):
+                file_meta['allowed_regions'] = frozenset(file_meta.get('allowed_regions', ()))
+        return file_meta
+
     def check_user_permission(self, username: str, file_id: str) -> dict:
         """
         Check if user has permission to access a file
@@ -25,14 +124,14 @@ class AccessControl:
         """
         # Get file metadata
         file_meta = self.db.get_file_metadata(file_id)
-        
+
         if not file_meta:
-            return {
-                'allowed': False,
-                'reason': 'File not found',
-                'check': 'file_exists'
-            }
-        
+            return _FILE_NOT_FOUND
+
+        return self._check_user_permission_with_meta(file_meta, username)
+
+    def _check_user_permission_with_meta(self, file_meta: dict, username: str) -> dict:
+        """Check user permission against already-fetched file metadata"""
         # Check if user is in allowed list
         if username not in file_meta['allowed_users']:
             return {
@@ -41,11 +140,7 @@ class AccessControl:
                 'check': 'user_permission'
             }
         
-        return {
-            'allowed': True,
-            'reason': 'User has permission',
-            'check': 'user_permission'
-        }
+        return _USER_HAS_PERMISSION
     
     def check_time_based_access(self, file_id: str) -> dict:
         """
@@ -59,41 +154,50 @@ class AccessControl:
         """
         # Get file metadata
         file_meta = self.db.get_file_metadata(file_id)
-        
+
         if not file_meta:
-            return {
-                'allowed': False,
-                'reason': 'File not found',
-                'check': 'time_based'
-            }
-        
+            return _FILE_NOT_FOUND_TIME
+
+        return self._check_time_with_meta(file_meta)
+
+    def _check_time_with_meta(self, file_meta: dict) -> dict:
+        """Check time-based access against already-fetched file metadata"""
         # Get current time
-        current_time = datetime.now().time()
-        
-        # Parse allowed time window
-        try:
-            start_time = datetime.strptime(file_meta['access_start_time'], '%H:%M').time()
-            end_time = datetime.strptime(file_meta['access_end_time'], '%H:%M').time()
-        except Exception as e:
-            return {
-                'allowed': False,
-                'reason': f'Invalid time format in file metadata: {str(e)}',
-                'check': 'time_based'
-            }
-        
-        # Check if current time is within window
-        if start_time <= current_time <= end_time:
+        now = datetime.now()
+
+        # Parse allowed time window into integer minutes since midnight
+        # (memoized - each distinct window is parsed once)
+        window_key = (file_meta['access_start_time'], file_meta['access_end_time'])
+        window = _TIME_WINDOW_CACHE.get(window_key)
+
+        if window is None:
+            try:
+                window = (_parse_window(file_meta['access_start_time']),
+                          _parse_window(file_meta['access_end_time']))
+            except Exception as e:
+                return {
+                    'allowed': False,
+                    'reason': f'Invalid time format in file metadata: {str(e)}',
+                    'check': 'time_based'
+                }
+            _TIME_WINDOW_CACHE[window_key] = window
+
+        start_min, end_min = window
+        now_min = now.hour * 60 + now.minute
+
+        # Check if current time is within window (plain integer compare)
+        if start_min <= now_min <= end_min:
             return {
                 'allowed': True,
                 'reason': f'Access allowed between {file_meta["access_start_time"]} and {file_meta["access_end_time"]}',
-                'current_time': current_time.strftime('%H:%M:%S'),
+                'current_time': now.strftime('%H:%M:%S'),
                 'check': 'time_based'
             }
         else:
             return {
                 'allowed': False,
                 'reason': f'Access only allowed between {file_meta["access_start_time"]} and {file_meta["access_end_time"]}',
-                'current_time': current_time.strftime('%H:%M:%S'),
+                'current_time': now.strftime('%H:%M:%S'),
                 'check': 'time_based'
             }
     
@@ -107,8 +211,20 @@ class AccessControl:
         Returns:
             dict: Location information
         """
-        # Skip localhost/private IPs
-        if ip_address in ['127.0.0.1', 'localhost'] or ip_address.startswith('192.168.'):
+        # Skip localhost/private IPs - covers all RFC1918 ranges, loopback,
+        # link-local and their IPv6 equivalents, not just 127.0.0.1/192.168.*
+        if ip_address == 'localhost':
+            is_local = True
+        else:
+            try:
+                addr = ipaddress.ip_address(ip_address)
+                is_local = addr.is_private or addr.is_loopback or addr.is_link_local
+            except ValueError:
+                # Malformed input falls through to the lookup path,
+                # matching the previous string-based behavior
+                is_local = False
+
+        if is_local:
             return {
                 'success': True,
                 'country_code': 'IN',  # Default to India for local testing
@@ -118,15 +234,37 @@ class AccessControl:
                 'is_local': True
             }
         
+        # Prefer the local GeoIP database when available - no network involved
+        if _GEOIP_READER is not None:
+            try:
+                geo = _GEOIP_READER.country(ip_address)
+                return {
+                    'success': True,
+                    'country_code': geo.country.iso_code or 'UNKNOWN',
+                    'country': geo.country.name or 'Unknown',
+                    'city': 'Unknown',
+                    'ip': ip_address,
+                    'is_local': False
+                }
+            except Exception:
+                # IP not in the local database - fall back to the remote API
+                pass
+
+        # Check the in-process cache before hitting the network
+        with _GEO_CACHE_LOCK:
+            cached = _GEO_CACHE.get(ip_address)
+            if cached and cached[0] > monotonic():
+                return cached[1]
+
         try:
             # Call free IP geolocation API
-            response = requests.get(f'http://ip-api.com/json/{ip_address}', timeout=3)
-            
+            response = _SESSION.get(f'http://ip-api.com/json/{ip_address}', timeout=3)
+
             if response.status_code == 200:
-                data = response.json()
-                
+                data = _json_loads(response.content)
+
                 if data['status'] == 'success':
-                    return {
+                    location = {
                         'success': True,
                         'country_code': data.get('countryCode', 'UNKNOWN'),
                         'country': data.get('country', 'Unknown'),
@@ -135,6 +273,14 @@ class AccessControl:
                         'ip': ip_address,
                         'is_local': False
                     }
+
+                    # Only cache successful lookups so transient errors don't stick
+                    with _GEO_CACHE_LOCK:
+                        while len(_GEO_CACHE) >= _GEO_CACHE_MAX:
+                            _GEO_CACHE.pop(next(iter(_GEO_CACHE)))
+                        _GEO_CACHE[ip_address] = (monotonic() + _GEO_CACHE_TTL, location)
+
+                    return location
             
             return {
                 'success': False,
@@ -162,16 +308,21 @@ class AccessControl:
         """
         # Get file metadata
         file_meta = self.db.get_file_metadata(file_id)
-        
+
         if not file_meta:
-            return {
-                'allowed': False,
-                'reason': 'File not found',
-                'check': 'location_based'
-            }
-        
-        # Get location from IP
-        location = self.get_location_from_ip(ip_address)
+            return _FILE_NOT_FOUND_LOCATION
+
+        return self._check_location_with_meta(file_meta, ip_address)
+
+    def _check_location_with_meta(self, file_meta: dict, ip_address: str, location: dict = None) -> dict:
+        """Check location-based access against already-fetched file metadata
+
+        Accepts an optional pre-fetched location so bulk callers can
+        share a single geolocation lookup across many files.
+        """
+        # Get location from IP (unless the caller already looked it up)
+        if location is None:
+            location = self.get_location_from_ip(ip_address)
         
         if not location.get('success'):
             # If location lookup fails, deny access for security
@@ -200,60 +351,215 @@ class AccessControl:
                 'check': 'location_based'
             }
     
-    def verify_access(self, username: str, file_id: str, ip_address: str) -> dict:
+    def verify_access(self, username: str, file_id: str, ip_address: str,
+                      skip_location: bool = False, audit: bool = True) -> dict:
         """
         Complete Zero-Trust verification: checks user, time, and location
-        
+
         Args:
             username: Username requesting access
             file_id: File ID to access
             ip_address: User's IP address
-        
+            skip_location: Skip the location check (for callers that have
+                           already verified location upstream, e.g. via CDN)
+            audit: When False, return only the terse decision
+                   (allowed/denied_reason/failed_check) and skip assembling
+                   the full per-check breakdown - faster in tight loops
+
         Returns:
             dict: Complete access verification result
         """
+        # Fetch file metadata once and share it across all checks
+        file_meta = self._normalize_meta(self.db.get_file_metadata(file_id))
+        return self._verify_with_meta(username, file_id, ip_address, file_meta,
+                                      skip_location=skip_location, audit=audit)
+
+    def _verify_with_meta(self, username: str, file_id: str, ip_address: str,
+                          file_meta: dict, location: dict = None,
+                          skip_location: bool = False, audit: bool = True) -> dict:
+        """
+        Run all Zero-Trust checks against already-fetched file metadata
+
+        The checks run cheapest-first with early exit; the full nested
+        results dict is only assembled when audit=True.
+        """
+        checks = []
+        failed = None  # (check_name, result) of the first failing check
+
+        if not file_meta:
+            checks.append(('user_permission', _FILE_NOT_FOUND))
+            failed = ('user_permission', _FILE_NOT_FOUND)
+        else:
+            # Check 1: User Permission
+            user_check = self._check_user_permission_with_meta(file_meta, username)
+            checks.append(('user_permission', user_check))
+
+            if not user_check['allowed']:
+                failed = ('user_permission', user_check)
+            else:
+                # Check 2: Time-Based Access
+                time_check = self._check_time_with_meta(file_meta)
+                checks.append(('time_based', time_check))
+
+                if not time_check['allowed']:
+                    failed = ('time_based', time_check)
+                elif not skip_location:
+                    # Check 3: Location-Based Access (the only network-bound
+                    # check, so it only runs after the cheap local checks pass)
+                    location_check = self._check_location_with_meta(file_meta, ip_address, location)
+                    checks.append(('location_based', location_check))
+
+                    if not location_check['allowed']:
+                        failed = ('location_based', location_check)
+
+        # Fast mode: terse decision only, no nested breakdown
+        if not audit:
+            return {
+                'allowed': failed is None,
+                'denied_reason': failed[1]['reason'] if failed else None,
+                'failed_check': failed[0] if failed else None
+            }
+
         verification_results = {
-            'allowed': False,
+            'allowed': failed is None,
             'username': username,
             'file_id': file_id,
             'ip_address': ip_address,
             'timestamp': datetime.now().isoformat(),
-            'checks': {}
+            'checks': dict(checks)
         }
-        
-        # Check 1: User Permission
-        user_check = self.check_user_permission(username, file_id)
-        verification_results['checks']['user_permission'] = user_check
-        
-        if not user_check['allowed']:
-            verification_results['denied_reason'] = user_check['reason']
-            verification_results['failed_check'] = 'user_permission'
-            return verification_results
-        
-        # Check 2: Time-Based Access
-        time_check = self.check_time_based_access(file_id)
-        verification_results['checks']['time_based'] = time_check
-        
-        if not time_check['allowed']:
-            verification_results['denied_reason'] = time_check['reason']
-            verification_results['failed_check'] = 'time_based'
-            return verification_results
-        
-        # Check 3: Location-Based Access
-        location_check = self.check_location_based_access(file_id, ip_address)
-        verification_results['checks']['location_based'] = location_check
-        
-        if not location_check['allowed']:
-            verification_results['denied_reason'] = location_check['reason']
-            verification_results['failed_check'] = 'location_based'
-            return verification_results
-        
-        # All checks passed!
-        verification_results['allowed'] = True
-        verification_results['message'] = 'All Zero-Trust checks passed - Access granted!'
-        
+
+        if failed:
+            verification_results['denied_reason'] = failed[1]['reason']
+            verification_results['failed_check'] = failed[0]
+        else:
+            # All checks passed!
+            verification_results['message'] = 'All Zero-Trust checks passed - Access granted!'
+
         return verification_results
 
+    @staticmethod
+    def _build_verifier(file_meta: dict):
+        """
+        Build a closure specialized to one file's ACL
+
+        The allowed users/regions and the parsed time window are captured
+        as locals, so each verification is just two set-membership tests
+        and an integer range compare - no dict lookups or parsing.
+        Expects normalized metadata; returns None if the window is invalid.
+        """
+        users = file_meta['allowed_users']
+        regions = file_meta['allowed_regions']
+        window_key = (file_meta['access_start_time'], file_meta['access_end_time'])
+
+        cache_key = (users, regions, window_key)
+        verifier = _VERIFIER_CACHE.get(cache_key)
+        if verifier is not None:
+            return verifier
+
+        try:
+            start_min = _parse_window(window_key[0])
+            end_min = _parse_window(window_key[1])
+        except Exception:
+            return None
+
+        def verifier(username, country_code, now_min):
+            return (username in users
+                    and start_min <= now_min <= end_min
+                    and country_code in regions)
+
+        while len(_VERIFIER_CACHE) >= _VERIFIER_CACHE_MAX:
+            _VERIFIER_CACHE.pop(next(iter(_VERIFIER_CACHE)))
+        _VERIFIER_CACHE[cache_key] = verifier
+
+        return verifier
+
+    def verify_access_fast(self, username: str, file_id: str, ip_address: str) -> bool:
+        """
+        Boolean-only Zero-Trust verification for hot loops
+
+        Uses a cached closure specialized to the file's ACL, so repeat
+        verifications of the same file skip all parsing and dict work.
+        Callers that need denial reasons should use verify_access.
+
+        Args:
+            username: Username requesting access
+            file_id: File ID to access
+            ip_address: User's IP address
+
+        Returns:
+            bool: True only if every check passes
+        """
+        file_meta = self._normalize_meta(self.db.get_file_metadata(file_id))
+        if not file_meta:
+            return False
+
+        verifier = self._build_verifier(file_meta)
+        if verifier is None:
+            return False
+
+        location = self.get_location_from_ip(ip_address)
+        if not location.get('success'):
+            return False
+
+        now = datetime.now()
+        return verifier(username, location['country_code'], now.hour * 60 + now.minute)
+
+    async def averify_access(self, username: str, file_id: str, ip_address: str) -> dict:
+        """
+        Async Zero-Trust verification that overlaps I/O
+
+        The metadata read and the geolocation lookup run concurrently in
+        worker threads, so wall-clock latency is max(db, network) instead
+        of their sum. Requires a running event loop (e.g. an ASGI server);
+        sync callers should keep using verify_access.
+
+        Args:
+            username: Username requesting access
+            file_id: File ID to access
+            ip_address: User's IP address
+
+        Returns:
+            dict: Complete access verification result
+        """
+        file_meta, location = await asyncio.gather(
+            asyncio.to_thread(self.db.get_file_metadata, file_id),
+            asyncio.to_thread(self.get_location_from_ip, ip_address),
+        )
+        return self._verify_with_meta(username, file_id, ip_address,
+                                      self._normalize_meta(file_meta), location)
+
+    def verify_access_bulk(self, username: str, file_ids: list, ip_address: str,
+                           audit: bool = True) -> dict:
+        """
+        Verify access to many files at once (e.g. for a directory listing)
+
+        Uses one metadata read and one geolocation lookup shared across
+        all files, instead of 3 DB reads + 1 HTTP call per file.
+
+        Args:
+            username: Username requesting access
+            file_ids: List of file IDs to check
+            ip_address: User's IP address
+            audit: When False, each result is the terse decision dict
+
+        Returns:
+            dict: {file_id: verification_result} for every requested file
+        """
+        # One geolocation lookup shared by every file's location check
+        location = self.get_location_from_ip(ip_address)
+
+        # One batched metadata read for all files
+        metas = self.db.get_file_metadata_batch(file_ids)
+
+        results = {}
+        for file_id in file_ids:
+            results[file_id] = self._verify_with_meta(
+                username, file_id, ip_address,
+                self._normalize_meta(metas.get(file_id)), location, audit=audit
+            )
+        return results
+
 
 # Test the access control
 if __name__ == "__main__":
@@ -1,11 +1,37 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, g, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS, cross_origin
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, create_access_token
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import os
+import hashlib
+import hmac
 import io
+import itertools
+import queue
+import tempfile
+import threading
+import time
 from dotenv import load_dotenv
 
+# Optional fast multipart parser - Werkzeug's pure-Python parser is very
+# CPU-heavy on large uploads, so use streaming-form-data when installed
+try:
+    from streaming_form_data import StreamingFormDataParser
+    from streaming_form_data.targets import BaseTarget, ValueTarget
+    HAS_STREAMING_PARSER = True
+except ImportError:
+    HAS_STREAMING_PARSER = False
+
+# Optional fast JSON - orjson serializes 2-5x faster than stdlib json,
+# which matters for large /api/files responses
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Import our custom modules
 from encryption import FileEncryption
 from aws_handler import AWSHandler
@@ -19,6 +45,34 @@ load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
+
+# Trust X-Forwarded-* headers from the configured number of proxies so
+# request.remote_addr is the real client IP behind a load balancer
+# (and can't be spoofed when running without one: TRUSTED_PROXIES=0)
+_trusted_proxies = int(os.getenv('TRUSTED_PROXIES', '1'))
+if _trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_trusted_proxies, x_proto=_trusted_proxies)
+
+# Serialize responses (and parse request bodies - Flask routes
+# request.get_json through the same provider) with orjson when available
+if HAS_ORJSON:
+    from flask.json.provider import DefaultJSONProvider
+
+    class ORJSONProvider(DefaultJSONProvider):
+        """JSON provider backed by orjson for faster (de)serialization"""
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(
+                obj,
+                default=self.default,
+                option=orjson.OPT_NON_STR_KEYS
+            ).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
+
 CORS(app, resources={
     r"/api/*": {
         "origins": "*",
@@ -32,6 +86,11 @@ CORS(app, resources={
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 jwt = JWTManager(app)
 
+# Cache verified JWT claims for a short TTL so bursts of requests with
+# the same token skip repeat signature verification
+from jwt_cache import install_jwt_cache
+install_jwt_cache()
+
 # Initialize our handlers
 encryptor = FileEncryption()
 aws_handler = AWSHandler()
@@ -41,62 +100,298 @@ audit_logger = AuditLogger()
 database = Database()
 
 # Configuration
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xlsx', 'zip'}
+ALLOWED_EXTENSIONS = frozenset({'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xlsx', 'zip'})
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # Matches S3's minimum multipart part size
+
+# Environment-backed defaults, read once at import so the upload path
+# doesn't hit os.environ per request (config is per-process anyway)
+DEFAULT_ACCESS_START_TIME = os.getenv('DEFAULT_ACCESS_START_TIME', '09:00')
+DEFAULT_ACCESS_END_TIME = os.getenv('DEFAULT_ACCESS_END_TIME', '18:00')
+DEFAULT_ALLOWED_REGIONS = os.getenv('ALLOWED_REGIONS', 'IN,US,GB')
+
+# Reject oversized request bodies at the socket level instead of spooling
+# them in full before the size check (multipart framing gets a little
+# headroom on top of the file limit)
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE + 1024 * 1024
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(error):
+    """Return the standard JSON envelope when Werkzeug rejects a big body"""
+    return jsonify({
+        'success': False,
+        'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)} MB'
+    }), 413
+
+def read_file_chunks(stream, counter):
+    """Yield the upload stream in chunks, enforcing MAX_FILE_SIZE as we go"""
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        counter['total'] += len(chunk)
+        if counter['total'] > MAX_FILE_SIZE:
+            raise ValueError('File too large')
+        yield chunk
+
+def through_queue(iterator, maxsize=10):
+    """
+    Run an iterator on a background thread, yielding via a bounded queue
+
+    Lets the producer stage (read + encrypt) work ahead of the consumer
+    stage (S3 upload) by up to maxsize chunks, so the two overlap instead
+    of running strictly one after the other.
+    """
+    done = object()
+    chunk_queue = queue.Queue(maxsize=maxsize)
+    errors = []
+    abandoned = threading.Event()
+
+    def put_item(item):
+        """Block until queued, giving up if the consumer has gone away"""
+        while not abandoned.is_set():
+            try:
+                chunk_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put_item(item):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put_item(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while True:
+            item = chunk_queue.get()
+            if item is done:
+                break
+            yield item
+
+        if errors:
+            raise errors[0]
+    finally:
+        # If the consumer stops early (S3 error mid-upload, aborted
+        # request), tell the producer and drain the queue so a put
+        # blocked on the full queue unblocks - otherwise the thread
+        # (and its spooled temp file) would leak on every failed upload
+        abandoned.set()
+        while True:
+            try:
+                chunk_queue.get_nowait()
+            except queue.Empty:
+                break
+
+if HAS_STREAMING_PARSER:
+    class SpooledFileTarget(BaseTarget):
+        """
+        Streams the uploaded file into a spooled temp file
+
+        Small files stay in RAM; anything over one chunk spills to disk,
+        so parsing memory stays bounded. MAX_FILE_SIZE is enforced as
+        bytes arrive instead of after buffering the whole body.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.file = tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE)
+            self.size = 0
+
+        def on_data_received(self, chunk):
+            self.size += len(chunk)
+            if self.size > MAX_FILE_SIZE:
+                raise ValueError('File too large')
+            self.file.write(chunk)
+
+UPLOAD_FORM_FIELDS = ('password', 'allowed_users', 'access_start_time',
+                      'access_end_time', 'allowed_regions')
+
+def parse_upload_form():
+    """
+    Parse the multipart upload body
+
+    Uses streaming-form-data when available (C-accelerated, spools the
+    file to a temp file instead of buffering the body); falls back to
+    Werkzeug's standard parsing otherwise.
+
+    Returns:
+        tuple: (file_stream, filename, form) - file_stream is None
+               when no file field was present
+
+    Raises:
+        ValueError: if the file exceeds MAX_FILE_SIZE
+    """
+    content_type = request.content_type or ''
+
+    if HAS_STREAMING_PARSER and content_type.startswith('multipart/form-data'):
+        parser = StreamingFormDataParser(headers=dict(request.headers))
+        file_target = SpooledFileTarget()
+        field_targets = {name: ValueTarget() for name in UPLOAD_FORM_FIELDS}
+
+        parser.register('file', file_target)
+        for name, target in field_targets.items():
+            parser.register(name, target)
+
+        while True:
+            chunk = request.stream.read(65536)
+            if not chunk:
+                break
+            parser.data_received(chunk)
+
+        form = {name: target.value.decode('utf-8')
+                for name, target in field_targets.items() if target.value}
+
+        if file_target.multipart_filename is None and file_target.size == 0:
+            return None, None, form
 
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+        file_target.file.seek(0)
+        return file_target.file, file_target.multipart_filename or '', form
 
-def get_file_extension(filename):
-    """Get file extension"""
-    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    # Fallback: Werkzeug's standard parser
+    if 'file' not in request.files:
+        return None, None, request.form
+
+    file = request.files['file']
+    return file.stream, file.filename, request.form
+
+def check_file_extension(filename):
+    """
+    Check and extract the file extension in one pass
+
+    Returns:
+        tuple: (allowed, extension) - a single rpartition scan instead
+               of separate allowed_file/get_file_extension calls
+    """
+    _, sep, extension = filename.rpartition('.')
+    extension = extension.lower()
+    return bool(sep) and extension in ALLOWED_EXTENSIONS, extension
+
+def get_file_meta(file_id):
+    """
+    Request-scoped cache in front of database.get_file_metadata
+
+    A handler that first checks then acts on the same file reads its
+    metadata once per request; the database layer's TTL cache handles
+    reuse across requests.
+    """
+    cache = getattr(g, '_file_meta', None)
+    if cache is None:
+        cache = g._file_meta = {}
+    if file_id not in cache:
+        cache[file_id] = database.get_file_metadata(file_id)
+    return cache[file_id]
 
 def get_client_ip():
-    """Get client's IP address"""
-    if request.headers.get('X-Forwarded-For'):
-        return request.headers.get('X-Forwarded-For').split(',')[0]
+    """Get client's IP address (ProxyFix already resolved forwarding headers)"""
     return request.remote_addr or '127.0.0.1'
 
 
+def parse_csv_field(value):
+    """Split a comma-separated form field into stripped non-empty items"""
+    return list(filter(None, (item.strip() for item in value.split(',')))) if value else []
+
+
+# Short-lived signed "access grants": after a download passes the full
+# Zero-Trust check, the response carries an HMAC token the client can
+# echo back, letting repeat downloads of the same file within the TTL
+# skip re-running the policy engine (the JWT still gates the route)
+ACCESS_GRANT_TTL = 60  # seconds
+
+
+def _grant_ip_scope(ip_address):
+    """Reduce an IP to the granularity a grant is bound to (/24 for IPv4)"""
+    if ip_address.count('.') == 3:
+        return ip_address.rsplit('.', 1)[0]
+    return ip_address
+
+
+def _grant_signature(username, file_id, expires, ip_address):
+    message = f"{username}|{file_id}|{expires}|{_grant_ip_scope(ip_address)}"
+    return hmac.new(
+        app.config['JWT_SECRET_KEY'].encode(),
+        message.encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def make_access_grant(username, file_id, ip_address):
+    """Issue a signed grant for this user/file/network, valid briefly"""
+    expires = int(time.time()) + ACCESS_GRANT_TTL
+    return f"{expires}.{_grant_signature(username, file_id, expires, ip_address)}"
+
+
+def check_access_grant(grant, username, file_id, ip_address):
+    """Verify a grant the client echoed back; False on any mismatch"""
+    try:
+        expires_str, signature = grant.split('.', 1)
+        expires = int(expires_str)
+    except (ValueError, AttributeError):
+        return False
+    if expires <= time.time():
+        return False
+    expected = _grant_signature(username, file_id, expires, ip_address)
+    return hmac.compare_digest(signature, expected)
+
+
 # ==================== PUBLIC ENDPOINTS (No Authentication) ====================
 
+# The home payload never changes, so serialize it once at import time -
+# health-check pollers hit / constantly and shouldn't pay for a fresh
+# dict build + JSON encode every probe
+_HOME_BODY = app.json.dumps({
+    'status': 'success',
+    'message': 'CloudSentinel Zero-Trust API is running! 🛡️',
+    'version': '2.0 - Zero Trust Edition',
+    'features': [
+        'User Authentication',
+        'File Encryption (AES-256)',
+        'Zero-Trust Access Control',
+        'Time-Based Access',
+        'Location-Based Access',
+        'Audit Logging'
+    ],
+    'endpoints': {
+        'auth': {
+            'register': '/api/auth/register',
+            'login': '/api/auth/login',
+            'user_info': '/api/auth/me'
+        },
+        'files': {
+            'upload': '/api/upload',
+            'download': '/api/download/<file_id>',
+            'list': '/api/files',
+            'my_files': '/api/files/my',
+            'share': '/api/files/<file_id>/share',
+            'delete': '/api/files/<file_id>'
+        },
+        'audit': {
+            'my_activity': '/api/audit/me',
+            'file_activity': '/api/audit/file/<file_id>',
+            'security_report': '/api/audit/report'
+        }
+    }
+}).encode('utf-8')
+_HOME_ETAG = hashlib.md5(_HOME_BODY).hexdigest()
+
+
 @app.route('/')
 def home():
-    """Home endpoint - API status"""
-    return jsonify({
-        'status': 'success',
-        'message': 'CloudSentinel Zero-Trust API is running! 🛡️',
-        'version': '2.0 - Zero Trust Edition',
-        'features': [
-            'User Authentication',
-            'File Encryption (AES-256)',
-            'Zero-Trust Access Control',
-            'Time-Based Access',
-            'Location-Based Access',
-            'Audit Logging'
-        ],
-        'endpoints': {
-            'auth': {
-                'register': '/api/auth/register',
-                'login': '/api/auth/login',
-                'user_info': '/api/auth/me'
-            },
-            'files': {
-                'upload': '/api/upload',
-                'download': '/api/download/<file_id>',
-                'list': '/api/files',
-                'my_files': '/api/files/my',
-                'share': '/api/files/<file_id>/share',
-                'delete': '/api/files/<file_id>'
-            },
-            'audit': {
-                'my_activity': '/api/audit/me',
-                'file_activity': '/api/audit/file/<file_id>',
-                'security_report': '/api/audit/report'
-            }
-        }
-    })
+    """Home endpoint - API status (precomputed response)"""
+    if _HOME_ETAG in request.if_none_match:
+        return '', 304
+
+    response = Response(_HOME_BODY, mimetype='application/json')
+    response.set_etag(_HOME_ETAG)
+    return response
 
 
 @app.route('/api/auth/register', methods=['POST'])
@@ -197,82 +492,160 @@ def upload_file():
     """
     try:
         current_user = get_jwt_identity()
-        
+
+        # Fail fast on declared-oversize bodies before reading anything
+        if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+            return jsonify({
+                'success': False,
+                'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)} MB'
+            }), 413
+
+        # Parse the multipart body (streaming parser when available)
+        try:
+            file_stream, upload_filename, form = parse_upload_form()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)} MB'
+            }), 400
+
         # Check if file is in request
-        if 'file' not in request.files:
+        if file_stream is None:
             return jsonify({
                 'success': False,
                 'message': 'No file provided'
             }), 400
-        
-        file = request.files['file']
-        password = request.form.get('password')
-        
+
+        password = form.get('password')
+
         # Optional: Access control settings
-        allowed_users = request.form.get('allowed_users', current_user)  # Comma-separated usernames
-        access_start_time = request.form.get('access_start_time', os.getenv('DEFAULT_ACCESS_START_TIME', '09:00'))
-        access_end_time = request.form.get('access_end_time', os.getenv('DEFAULT_ACCESS_END_TIME', '18:00'))
-        allowed_regions = request.form.get('allowed_regions', os.getenv('ALLOWED_REGIONS', 'IN,US,GB'))
-        
+        allowed_users = form.get('allowed_users') or current_user  # Comma-separated usernames
+        access_start_time = form.get('access_start_time') or DEFAULT_ACCESS_START_TIME
+        access_end_time = form.get('access_end_time') or DEFAULT_ACCESS_END_TIME
+        allowed_regions = form.get('allowed_regions') or DEFAULT_ALLOWED_REGIONS
+
         # Validate inputs
-        if file.filename == '':
+        if upload_filename == '':
             return jsonify({
                 'success': False,
                 'message': 'No file selected'
             }), 400
-        
+
         if not password:
             return jsonify({
                 'success': False,
                 'message': 'Password is required'
             }), 400
-        
-        if not allowed_file(file.filename):
+
+        extension_ok, file_extension = check_file_extension(upload_filename)
+        if not extension_ok:
             return jsonify({
                 'success': False,
                 'message': f'File type not allowed. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
             }), 400
-        
-        # Read file data
-        file_data = file.read()
-        
-        # Check file size
-        if len(file_data) > MAX_FILE_SIZE:
-            return jsonify({
-                'success': False,
-                'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)} MB'
-            }), 400
-        
+
         # Get original filename
-        original_filename = secure_filename(file.filename)
-        file_extension = get_file_extension(original_filename)
-        
-        # Step 1: Encrypt the file
-        print(f"🔐 Encrypting file: {original_filename} for user: {current_user}")
-        encryption_result = encryptor.encrypt_file(file_data, password)
-        
-        if not encryption_result['success']:
-            return jsonify({
-                'success': False,
-                'message': encryption_result['message']
-            }), 500
-        
-        # Step 2: Upload encrypted file to S3
-        print(f"☁️  Uploading to S3...")
+        original_filename = secure_filename(upload_filename)
+
+        # Parse the requested ACL once - it applies whether this turns
+        # out to be a fresh upload or a dedup hit
+        allowed_users_list = parse_csv_field(allowed_users)
+        if current_user not in allowed_users_list:
+            allowed_users_list.insert(0, current_user)  # Owner always has access
+        allowed_regions_list = parse_csv_field(allowed_regions)
+
+        # Step 0: Content dedup - the upload is already spooled locally,
+        # so hash it (bound to the password, since the stored salt only
+        # decrypts with the password used at encryption time) and skip
+        # the whole encrypt+upload if this user already uploaded the
+        # exact same file. Retries and duplicate submissions become
+        # O(hash) instead of O(encrypt + S3 transfer)
+        content_key = None
+        if file_stream.seekable():
+            hasher = hashlib.sha256(password.encode())
+            hash_counter = {'total': 0}
+            try:
+                for chunk in read_file_chunks(file_stream, hash_counter):
+                    hasher.update(chunk)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)} MB'
+                }), 413
+            file_stream.seek(0)
+            content_key = hasher.hexdigest()
+
+            duplicate = database.find_file_by_content_key(content_key, owner=current_user)
+            if duplicate:
+                dup_id, dup_meta = duplicate
+                print(f"♻️  Duplicate upload of {original_filename} by {current_user} - reusing {dup_id}")
+                # The request's ACL settings apply to the reused record
+                # - reporting success while silently keeping the old
+                # ACL would leave the user's settings unenforced
+                database.update_file_access(
+                    dup_id,
+                    allowed_users=allowed_users_list,
+                    access_times={'start': access_start_time,
+                                  'end': access_end_time},
+                    allowed_regions=allowed_regions_list
+                )
+                audit_logger.log_upload(
+                    current_user,
+                    dup_id,
+                    original_filename,
+                    hash_counter['total'],
+                    get_client_ip()
+                )
+                return jsonify({
+                    'success': True,
+                    'message': 'Identical file already uploaded - reusing it! ♻️',
+                    'file_id': dup_id,
+                    'original_filename': dup_meta['original_filename'],
+                    'original_size': hash_counter['total'],
+                    'deduplicated': True,
+                    'access_control': {
+                        'allowed_users': allowed_users_list,
+                        'time_window': f"{access_start_time} - {access_end_time}",
+                        'allowed_regions': allowed_regions_list
+                    }
+                }), 200
+
+        # Steps 1+2: Encrypt and upload as one streaming pipeline
+        # The file is read and encrypted in 5 MB chunks on a background
+        # thread while this thread streams finished parts to S3, so
+        # encryption overlaps the upload and memory stays bounded instead
+        # of holding the whole file (plus ciphertext) in RAM
+        print(f"🔐 Encrypting and uploading: {original_filename} for user: {current_user}")
+        salt = os.urandom(16)
+        bytes_read = {'total': 0}
+        plain_chunks = read_file_chunks(file_stream, bytes_read)
+        encrypted_chunks = encryptor.encrypt_stream(plain_chunks, password, salt)
         encrypted_filename = f"{current_user}_{original_filename}.encrypted"
-        
-        upload_result = aws_handler.upload_file(
-            file_data=encryption_result['encrypted_data'],
+
+        upload_result = aws_handler.upload_multipart(
+            chunks=through_queue(encrypted_chunks),
             filename=encrypted_filename,
             metadata={
-                'salt': encryption_result['salt'],
+                'salt': salt,
+                # Pre-switch files lack these tags and fall back to the
+                # original pbkdf2 + Fernet combination on download; the
+                # framing tag tells download to demand the end-of-stream
+                # marker, so a truncated object can't decrypt silently
+                'kdf': 'scrypt',
+                'cipher': 'aes-gcm',
+                'framing': 'end-marked',
                 'original_filename': original_filename,
                 'file_extension': file_extension,
                 'owner': current_user
             }
         )
-        
+
         if not upload_result['success']:
+            if 'File too large' in upload_result['message']:
+                return jsonify({
+                    'success': False,
+                    'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)} MB'
+                }), 400
             return jsonify({
                 'success': False,
                 'message': upload_result['message']
@@ -280,15 +653,7 @@ def upload_file():
         
         # Step 3: Save file metadata with Zero-Trust access control
         file_id = upload_result['s3_key']
-        
-        # Parse allowed users
-        allowed_users_list = [u.strip() for u in allowed_users.split(',') if u.strip()]
-        if current_user not in allowed_users_list:
-            allowed_users_list.insert(0, current_user)  # Owner always has access
-        
-        # Parse allowed regions
-        allowed_regions_list = [r.strip() for r in allowed_regions.split(',') if r.strip()]
-        
+
         metadata_result = database.save_file_metadata(
             file_id=file_id,
             owner=current_user,
@@ -297,9 +662,11 @@ def upload_file():
                 'access_start_time': access_start_time,
                 'access_end_time': access_end_time,
                 'allowed_regions': allowed_regions_list,
+                'content_key': content_key,
+                's3_key': upload_result['s3_key'],
                 'encryption_metadata': {
                     'encrypted_size': upload_result['size'],
-                    'original_size': len(file_data)
+                    'original_size': bytes_read['total']
                 }
             }
         )
@@ -318,7 +685,7 @@ def upload_file():
             current_user,
             file_id,
             original_filename,
-            len(file_data),
+            bytes_read['total'],
             get_client_ip()
         )
         
@@ -329,7 +696,7 @@ def upload_file():
             'file_id': file_id,
             'original_filename': original_filename,
             'encrypted_size': upload_result['size'],
-            'original_size': len(file_data),
+            'original_size': bytes_read['total'],
             'access_control': {
                 'allowed_users': allowed_users_list,
                 'time_window': f"{access_start_time} - {access_end_time}",
@@ -368,9 +735,16 @@ def download_file(file_id):
             }), 400
         
         # ZERO-TRUST VERIFICATION
-        print(f"🛡️  Zero-Trust verification for {current_user} accessing {file_id}")
-        verification = access_control.verify_access(current_user, file_id, client_ip)
-        
+        # A valid grant from a recent successful check on this same
+        # file/user/network lets repeat downloads skip the policy engine
+        grant = request.headers.get('X-Access-Grant')
+        if grant and check_access_grant(grant, current_user, file_id, client_ip):
+            print(f"🛡️  Access grant accepted for {current_user} on {file_id}")
+            verification = {'allowed': True}
+        else:
+            print(f"🛡️  Zero-Trust verification for {current_user} accessing {file_id}")
+            verification = access_control.verify_access(current_user, file_id, client_ip)
+
         if not verification['allowed']:
             # Log access denied
             audit_logger.log_access_denied(
@@ -391,43 +765,56 @@ def download_file(file_id):
         
         print(f"✅ Zero-Trust verification passed!")
         
-        # Step 1: Download encrypted file from S3
+        # Step 1: Open a streaming download from S3
         print(f"☁️  Downloading from S3: {file_id}")
-        download_result = aws_handler.download_file(file_id)
-        
+        download_result = aws_handler.download_stream(file_id)
+
         if not download_result['success']:
             audit_logger.log_download(current_user, file_id, 'unknown', client_ip, success=False)
             return jsonify({
                 'success': False,
                 'message': download_result['message']
             }), 404
-        
-        # Step 2: Decrypt the file
+
+        # Step 2: Decrypt chunk-by-chunk while streaming to the client,
+        # so only one chunk of plaintext is in memory per download.
+        # The first chunk is pulled eagerly so a wrong password still
+        # fails with a clean 401 instead of dying mid-stream.
         print(f"🔓 Decrypting file...")
-        decryption_result = encryptor.decrypt_file(
-            encrypted_data=download_result['file_data'],
+        plain_chunks = encryptor.decrypt_stream(
+            download_result['chunks'],
             password=password,
-            salt=download_result['metadata']['salt']
+            salt=download_result['metadata']['salt'],
+            kdf=download_result['metadata'].get('kdf', 'pbkdf2'),
+            cipher=download_result['metadata'].get('cipher', 'fernet'),
+            # Objects written before markers existed can't be checked
+            verify_complete=download_result['metadata'].get('framing') == 'end-marked'
         )
-        
-        if not decryption_result['success']:
-            audit_logger.log_download(current_user, file_id, 
-                                     download_result['metadata'].get('original_filename', 'unknown'), 
+
+        try:
+            first_chunk = next(plain_chunks, b'')
+        except Exception:
+            audit_logger.log_download(current_user, file_id,
+                                     download_result['metadata'].get('original_filename', 'unknown'),
                                      client_ip, success=False)
             return jsonify({
                 'success': False,
                 'message': 'Decryption failed - Wrong password?'
             }), 401
-        
+
         # Step 3: Log successful download
         original_filename = download_result['metadata'].get('original_filename', 'decrypted_file')
         audit_logger.log_download(current_user, file_id, original_filename, client_ip, success=True)
-        
-        # Step 4: Send decrypted file to user
-        return send_file(
-            io.BytesIO(decryption_result['decrypted_data']),
-            as_attachment=True,
-            download_name=original_filename
+
+        # Step 4: Stream the decrypted file to the user, with a fresh
+        # grant so follow-up downloads can skip policy evaluation
+        return Response(
+            stream_with_context(itertools.chain([first_chunk], plain_chunks)),
+            mimetype='application/octet-stream',
+            headers={
+                'Content-Disposition': f'attachment; filename="{original_filename}"',
+                'X-Access-Grant': make_access_grant(current_user, file_id, client_ip)
+            }
         )
     
     except Exception as e:
@@ -437,6 +824,70 @@ def download_file(file_id):
         }), 500
 
 
+@app.route('/api/download/<path:file_id>/url', methods=['POST'])
+@jwt_required()
+def get_download_url(file_id):
+    """
+    Get a pre-signed S3 URL for a file after Zero-Trust verification
+
+    Requires JWT authentication
+    The client downloads the encrypted object directly from S3 (no bytes
+    proxied through this server) and decrypts it locally; the salt
+    arrives with the object in its x-amz-meta-salt header.
+    """
+    try:
+        current_user = get_jwt_identity()
+        client_ip = get_client_ip()
+
+        # ZERO-TRUST VERIFICATION
+        print(f"🛡️  Zero-Trust verification for {current_user} accessing {file_id}")
+        verification = access_control.verify_access(current_user, file_id, client_ip)
+
+        if not verification['allowed']:
+            audit_logger.log_access_denied(
+                current_user,
+                file_id,
+                verification['denied_reason'],
+                verification['failed_check'],
+                client_ip,
+                details=verification['checks']
+            )
+
+            return jsonify({
+                'success': False,
+                'message': f"Access Denied: {verification['denied_reason']}",
+                'failed_check': verification['failed_check'],
+                'details': verification['checks']
+            }), 403
+
+        url_result = aws_handler.generate_download_url(file_id, expires_in=300)
+
+        if not url_result['success']:
+            audit_logger.log_download(current_user, file_id, 'unknown', client_ip, success=False)
+            return jsonify({
+                'success': False,
+                'message': url_result['message']
+            }), 404
+
+        file_meta = get_file_meta(file_id)
+        original_filename = file_meta.get('original_filename', 'unknown') if file_meta else 'unknown'
+        audit_logger.log_download(current_user, file_id, original_filename, client_ip, success=True)
+
+        return jsonify({
+            'success': True,
+            'message': 'Pre-signed URL generated',
+            'url': url_result['url'],
+            'expires_in': url_result['expires_in'],
+            'original_filename': original_filename
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Failed to generate download URL: {str(e)}'
+        }), 500
+
+
 @app.route('/api/files', methods=['GET'])
 @jwt_required()
 def list_all_accessible_files():
@@ -492,7 +943,7 @@ def share_file(file_id):
         data = request.get_json()
         
         # Get file metadata
-        file_meta = database.get_file_metadata(file_id)
+        file_meta = get_file_meta(file_id)
         
         if not file_meta:
             return jsonify({
@@ -545,7 +996,7 @@ def delete_file(file_id):
         current_user = get_jwt_identity()
         
         # Get file metadata
-        file_meta = database.get_file_metadata(file_id)
+        file_meta = get_file_meta(file_id)
         
         if not file_meta:
             return jsonify({
@@ -560,8 +1011,9 @@ def delete_file(file_id):
                 'message': 'Only file owner can delete files'
             }), 403
         
-        # Delete from S3
-        aws_result = aws_handler.delete_file(file_id)
+        # Delete from S3 (key comes from local metadata, falling back
+        # to the file_id for records saved before s3_key was persisted)
+        aws_result = aws_handler.delete_file(file_meta.get('s3_key', file_id))
         
         if not aws_result['success']:
             return jsonify(aws_result), 500
@@ -614,7 +1066,7 @@ def get_file_activity(file_id):
         limit = request.args.get('limit', 50, type=int)
         
         # Check if user has access to this file
-        file_meta = database.get_file_metadata(file_id)
+        file_meta = get_file_meta(file_id)
         
         if not file_meta:
             return jsonify({
@@ -659,6 +1111,13 @@ def get_security_report():
         }), 500
 
 
+# Werkzeug compiles the routing map's regexes lazily on the first
+# match; all routes are registered by this point, so compile them now
+# and keep that cost out of the first real request (and out of every
+# fresh gunicorn worker's first hit)
+app.url_map.bind('localhost').match('/')
+
+
 # ==================== RUN SERVER ====================
 
 if __name__ == '__main__':
@@ -677,8 +1136,11 @@ if __name__ == '__main__':
     print("="*70 + "\n")
     
     # Run Flask server
+    # threaded=True lets slow S3 round-trips overlap instead of the
+    # single-threaded default serializing every request behind them
     app.run(
         host='127.0.0.1',
         port=5000,
-        debug=True  # Shows detailed errors (disable in production!)
+        debug=True,  # Shows detailed errors (disable in production!)
+        threaded=True
     )
\ No newline at end of file
@@ -1,20 +1,133 @@
+from collections import Counter
 from database import Database
 from datetime import datetime
+from operator import itemgetter
+import atexit
 import json
+import logging
+import os
+import queue
+import threading
+import time
+
+# Per-event chatter goes through a gated logger with lazy %s
+# formatting: when DEBUG is off (production), each call costs one level
+# check instead of building an f-string and hitting stdout
+logger = logging.getLogger('cloudsentinel.audit')
+
+# Batched background writing keeps audit I/O off the request path:
+# events are queued and a daemon thread coalesces up to _FLUSH_BATCH
+# entries (or whatever arrives within _FLUSH_INTERVAL) into one write
+_FLUSH_BATCH = 100
+_FLUSH_INTERVAL = 0.2  # seconds
+
+# Aggregated summaries are cached keyed by the audit file's state, so
+# dashboard polling between events reuses the last computation instead
+# of re-scanning 1000 log lines per request
+_SUMMARY_CACHE = {}
+_SUMMARY_CACHE_LOCK = threading.Lock()
+_SUMMARY_CACHE_MAX = 256  # Bound memory usage (FIFO eviction)
+
 
 class AuditLogger:
     """
     Audit logging system for CloudSentinel
     Tracks all security-relevant events
     """
-    
+
+    _queue = queue.Queue()
+    _worker = None
+    _worker_lock = threading.Lock()
+
     def __init__(self):
         """Initialize audit logger with database"""
         self.db = Database()
-    
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        """Start the shared background flush thread on first use"""
+        with AuditLogger._worker_lock:
+            if AuditLogger._worker is None:
+                worker = threading.Thread(target=self._flush_loop, daemon=True)
+                AuditLogger._worker = worker
+                worker.start()
+                atexit.register(self.flush)
+
+    def _enqueue(self, event_type, username, file_id=None, details=None,
+                 ip_address=None, success=True):
+        """Queue an audit event for batched background writing
+
+        The timestamp is captured as a raw nanosecond counter (tens of
+        nanoseconds) and formatted to ISO by the flush thread, keeping
+        datetime construction off the request path.
+        """
+        AuditLogger._queue.put({
+            'timestamp': time.time_ns(),
+            'event_type': event_type,
+            'username': username,
+            'file_id': file_id,
+            'ip_address': ip_address,
+            'success': success,
+            'details': details or {}
+        })
+
+    def _collect_batch(self, block):
+        """Pull up to a batch of queued entries, optionally waiting briefly"""
+        batch = []
+        try:
+            if block:
+                batch.append(AuditLogger._queue.get(timeout=_FLUSH_INTERVAL))
+            while len(batch) < _FLUSH_BATCH:
+                batch.append(AuditLogger._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    @staticmethod
+    def _finalize_batch(batch):
+        """Format the raw capture timestamps to ISO before writing
+
+        Idempotent: entries re-queued after a failed write arrive here
+        already formatted and pass through unchanged.
+        """
+        for entry in batch:
+            if not isinstance(entry['timestamp'], str):
+                entry['timestamp'] = datetime.fromtimestamp(
+                    entry['timestamp'] / 1e9).isoformat()
+        return batch
+
+    def _flush_loop(self):
+        """Background thread: coalesce queued events into single writes
+
+        The loop must survive write failures: one raise out of the bulk
+        write would kill this singleton thread and silently drop every
+        audit event for the rest of the process. Failed batches are
+        re-queued and retried after a beat.
+        """
+        while True:
+            batch = self._collect_batch(block=True)
+            if not batch:
+                continue
+            try:
+                self.db.log_events_bulk(self._finalize_batch(batch))
+            except Exception as e:
+                print(f"❌ Audit flush failed, re-queueing {len(batch)} events: {str(e)}")
+                for entry in batch:
+                    AuditLogger._queue.put(entry)
+                time.sleep(_FLUSH_INTERVAL)
+
+    def flush(self):
+        """Write out any still-queued audit events (registered at exit)"""
+        while True:
+            batch = self._collect_batch(block=False)
+            if not batch:
+                break
+            self.db.log_events_bulk(self._finalize_batch(batch))
+
+
     def log_upload(self, username: str, file_id: str, filename: str, size: int, ip_address: str) -> None:
         """Log file upload event"""
-        self.db.log_event(
+        self._enqueue(
             event_type='FILE_UPLOAD',
             username=username,
             file_id=file_id,
@@ -26,11 +139,11 @@ class AuditLogger:
             ip_address=ip_address,
             success=True
         )
-        print(f"📋 Logged: {username} uploaded {filename}")
+        logger.debug("Logged: %s uploaded %s", username, filename)
     
     def log_download(self, username: str, file_id: str, filename: str, ip_address: str, success: bool = True) -> None:
         """Log file download event"""
-        self.db.log_event(
+        self._enqueue(
             event_type='FILE_DOWNLOAD',
             username=username,
             file_id=file_id,
@@ -41,8 +154,7 @@ class AuditLogger:
             ip_address=ip_address,
             success=success
         )
-        status = "✅" if success else "❌"
-        print(f"📋 Logged: {status} {username} download attempt for {filename}")
+        logger.debug("Logged: %s download attempt for %s (success=%s)", username, filename, success)
     
     def log_access_denied(self, username: str, file_id: str, reason: str, failed_check: str, ip_address: str, details: dict = None) -> None:
         """Log access denied event"""
@@ -62,11 +174,11 @@ class AuditLogger:
             ip_address=ip_address,
             success=False
         )
-        print(f"📋 Logged: ❌ Access denied for {username} - {reason}")
+        logger.debug("Logged: access denied for %s - %s", username, reason)
     
     def log_permission_change(self, username: str, file_id: str, changes: dict, ip_address: str) -> None:
         """Log permission/access control changes"""
-        self.db.log_event(
+        self._enqueue(
             event_type='PERMISSION_CHANGE',
             username=username,
             file_id=file_id,
@@ -77,11 +189,11 @@ class AuditLogger:
             ip_address=ip_address,
             success=True
         )
-        print(f"📋 Logged: {username} modified permissions for {file_id}")
+        logger.debug("Logged: %s modified permissions for %s", username, file_id)
     
     def log_file_deletion(self, username: str, file_id: str, filename: str, ip_address: str) -> None:
         """Log file deletion event"""
-        self.db.log_event(
+        self._enqueue(
             event_type='FILE_DELETE',
             username=username,
             file_id=file_id,
@@ -92,19 +204,18 @@ class AuditLogger:
             ip_address=ip_address,
             success=True
         )
-        print(f"📋 Logged: {username} deleted {filename}")
+        logger.debug("Logged: %s deleted %s", username, filename)
     
     def log_authentication(self, username: str, event_type: str, ip_address: str, success: bool, details: dict = None) -> None:
         """Log authentication events (login, logout, etc.)"""
-        self.db.log_event(
+        self._enqueue(
             event_type=event_type,
             username=username,
             details=details or {},
             ip_address=ip_address,
             success=success
         )
-        status = "✅" if success else "❌"
-        print(f"📋 Logged: {status} {event_type} for {username}")
+        logger.debug("Logged: %s for %s (success=%s)", event_type, username, success)
     
     def get_user_activity(self, username: str, limit: int = 50) -> dict:
         """Get activity logs for a specific user"""
@@ -139,44 +250,45 @@ class AuditLogger:
         }
     
     def get_security_summary(self, username: str = None) -> dict:
-        """Get security summary statistics"""
+        """Get security summary statistics (cached until the log changes)"""
+        try:
+            stat = os.stat(self.db.audit_file)
+            cache_key = (username, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            cache_key = None
+
+        if cache_key is not None:
+            with _SUMMARY_CACHE_LOCK:
+                cached = _SUMMARY_CACHE.get(cache_key)
+            if cached is not None:
+                return {'success': True, 'summary': dict(cached)}
+
         logs = self.db.get_audit_logs(username=username, limit=1000)
-        
+
+        # Both tallies run entirely at C speed: map(itemgetter) feeds
+        # Counter without a Python-level loop or generator frame per
+        # record; the named counts below are just lookups into them
+        event_types = Counter(map(itemgetter('event_type'), logs))
+        successful = Counter(map(itemgetter('success'), logs))[True]
+
         summary = {
             'total_events': len(logs),
-            'successful_events': 0,
-            'failed_events': 0,
-            'access_denied': 0,
-            'uploads': 0,
-            'downloads': 0,
-            'login_attempts': 0,
-            'failed_logins': 0,
-            'event_types': {}
+            'successful_events': successful,
+            'failed_events': len(logs) - successful,
+            'access_denied': event_types['ACCESS_DENIED'],
+            'uploads': event_types['FILE_UPLOAD'],
+            'downloads': event_types['FILE_DOWNLOAD'],
+            'login_attempts': event_types['LOGIN_SUCCESS'] + event_types['LOGIN_FAILED'],
+            'failed_logins': event_types['LOGIN_FAILED'],
+            'event_types': dict(event_types)
         }
-        
-        for log in logs:
-            # Count successes and failures
-            if log['success']:
-                summary['successful_events'] += 1
-            else:
-                summary['failed_events'] += 1
-            
-            # Count specific event types
-            event_type = log['event_type']
-            summary['event_types'][event_type] = summary['event_types'].get(event_type, 0) + 1
-            
-            # Count specific events
-            if event_type == 'ACCESS_DENIED':
-                summary['access_denied'] += 1
-            elif event_type == 'FILE_UPLOAD':
-                summary['uploads'] += 1
-            elif event_type == 'FILE_DOWNLOAD':
-                summary['downloads'] += 1
-            elif event_type in ['LOGIN_SUCCESS', 'LOGIN_FAILED']:
-                summary['login_attempts'] += 1
-                if event_type == 'LOGIN_FAILED':
-                    summary['failed_logins'] += 1
-        
+
+        if cache_key is not None:
+            with _SUMMARY_CACHE_LOCK:
+                while len(_SUMMARY_CACHE) >= _SUMMARY_CACHE_MAX:
+                    _SUMMARY_CACHE.pop(next(iter(_SUMMARY_CACHE)))
+                _SUMMARY_CACHE[cache_key] = summary
+
         return {
             'success': True,
             'summary': summary
@@ -224,22 +336,25 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 # Test the audit logger
 if __name__ == "__main__":
     print("📋 Testing Audit Logger...\n")
-    
-    logger = AuditLogger()
+
+    # Show the per-event debug lines when run as a demo
+    logging.basicConfig(level=logging.DEBUG, format='📋 %(message)s')
+
+    audit = AuditLogger()
     
     # Test 1: Log upload
     print("Test 1: Logging file upload...")
-    logger.log_upload('dhruv123', 'file_001', 'secret.pdf', 2048, '192.168.1.100')
+    audit.log_upload('dhruv123', 'file_001', 'secret.pdf', 2048, '192.168.1.100')
     print()
     
     # Test 2: Log successful download
     print("Test 2: Logging successful download...")
-    logger.log_download('dhruv123', 'file_001', 'secret.pdf', '192.168.1.100', success=True)
+    audit.log_download('dhruv123', 'file_001', 'secret.pdf', '192.168.1.100', success=True)
     print()
     
     # Test 3: Log access denied
     print("Test 3: Logging access denied...")
-    logger.log_access_denied(
+    audit.log_access_denied(
         'hacker123', 
         'file_001', 
         'User not authorized', 
@@ -251,13 +366,16 @@ if __name__ == "__main__":
     
     # Test 4: Log authentication
     print("Test 4: Logging authentication events...")
-    logger.log_authentication('dhruv123', 'LOGIN_SUCCESS', '192.168.1.100', True)
-    logger.log_authentication('hacker123', 'LOGIN_FAILED', '123.45.67.89', False, {'reason': 'Invalid password'})
+    audit.log_authentication('dhruv123', 'LOGIN_SUCCESS', '192.168.1.100', True)
+    audit.log_authentication('hacker123', 'LOGIN_FAILED', '123.45.67.89', False, {'reason': 'Invalid password'})
     print()
     
+    # Flush queued events so the reads below see them
+    audit.flush()
+
     # Test 5: Get user activity
     print("Test 5: Getting user activity...")
-    activity = logger.get_user_activity('dhruv123', limit=10)
+    activity = audit.get_user_activity('dhruv123', limit=10)
     print(f"   Found {activity['total_events']} events for {activity['username']}")
     if activity['logs']:
         print(f"   Latest event: {activity['logs'][0]['event_type']} at {activity['logs'][0]['timestamp']}")
@@ -265,7 +383,7 @@ if __name__ == "__main__":
     
     # Test 6: Get security summary
     print("Test 6: Getting security summary...")
-    summary = logger.get_security_summary()
+    summary = audit.get_security_summary()
     print(f"   Total events: {summary['summary']['total_events']}")
     print(f"   Successful: {summary['summary']['successful_events']}")
     print(f"   Failed: {summary['summary']['failed_events']}")
@@ -274,7 +392,7 @@ if __name__ == "__main__":
     
     # Test 7: Generate security report
     print("Test 7: Generating security report...")
-    report = logger.generate_security_report('dhruv123')
+    report = audit.generate_security_report('dhruv123')
     print(report)
     
     print("✅ Audit Logger tests completed!")
\ No newline at end of file
@@ -1,4 +1,9 @@
+import base64
+import io
+import itertools
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 import os
 from dotenv import load_dotenv
@@ -12,9 +17,21 @@ class AWSHandler:
     """
     Handles all AWS S3 interactions for CloudSentinel
     """
-    
+
+    # Shared instance: boto3.client() is expensive (botocore loads its
+    # service models on construction), so every AWSHandler() returns
+    # the same object with the same pooled S3 client
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __init__(self):
-        """Initialize AWS S3 client"""
+        """Initialize AWS S3 client (once per process)"""
+        if getattr(self, '_initialized', False):
+            return
         try:
             # Get credentials from .env file
             self.aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
@@ -26,22 +43,86 @@ class AWSHandler:
             if not all([self.aws_access_key, self.aws_secret_key, self.region, self.bucket_name]):
                 raise ValueError("Missing AWS credentials in .env file")
             
-            # Create S3 client
+            # Create S3 client (one per process, reused by every handler)
+            # A large keep-alive connection pool means only the first
+            # request pays TCP+TLS handshake cost, and adaptive retries
+            # absorb transient S3 throttles instead of bubbling errors
             self.s3_client = boto3.client(
                 's3',
                 aws_access_key_id=self.aws_access_key,
                 aws_secret_access_key=self.aws_secret_key,
-                region_name=self.region
+                region_name=self.region,
+                config=Config(
+                    max_pool_connections=100,
+                    retries={'max_attempts': 3, 'mode': 'adaptive'},
+                    tcp_keepalive=True
+                )
             )
             
+            # Parallel multipart transfers for large whole-buffer uploads
+            self.transfer_config = TransferConfig(
+                multipart_threshold=8 * 1024 * 1024,
+                multipart_chunksize=8 * 1024 * 1024,
+                max_concurrency=10,
+                use_threads=True
+            )
+
+            self._initialized = True
+
             print(f"✅ AWS S3 client initialized successfully")
             print(f"   Bucket: {self.bucket_name}")
             print(f"   Region: {self.region}")
-            
+
         except Exception as e:
             print(f"❌ Failed to initialize AWS S3 client: {str(e)}")
             raise
     
+    # New uploads carry their metadata as a small binary header at the
+    # start of the object body instead of S3 user metadata. That keeps
+    # the salt as raw bytes (no base64 round-trip), lifts S3's 2 KB
+    # user-metadata cap, and downloads get the metadata from the same
+    # GET that fetches the data. The magic is sniffed on download, so
+    # older objects still read their metadata the legacy way.
+    #
+    # Header layout:
+    #   magic 'CSM1' | salt length (2 bytes BE) | salt
+    #   | JSON length (4 bytes BE) | JSON of the string metadata
+    _META_MAGIC = b'CSM1'
+
+    @classmethod
+    def _pack_metadata(cls, metadata: dict) -> bytes:
+        """Serialize metadata into the binary body-header format"""
+        metadata = metadata or {}
+        salt = metadata.get('salt', b'')
+        strings = {key: str(value) for key, value in metadata.items()
+                   if key != 'salt'}
+        blob = json.dumps(strings).encode('utf-8')
+        return (cls._META_MAGIC
+                + len(salt).to_bytes(2, 'big') + salt
+                + len(blob).to_bytes(4, 'big') + blob)
+
+    @classmethod
+    def _parse_meta_header(cls, buf: bytes):
+        """
+        Parse a body-header from a buffered object prefix
+
+        Returns:
+            (metadata, header_length) if the buffer starts with the
+            header magic, None if it's a legacy object without one
+        """
+        if buf[:4] != cls._META_MAGIC:
+            return None
+        salt_len = int.from_bytes(buf[4:6], 'big')
+        blob_start = 6 + salt_len + 4
+        blob_len = int.from_bytes(buf[6 + salt_len:blob_start], 'big')
+        header_len = blob_start + blob_len
+        if len(buf) < header_len:
+            raise ValueError('Metadata header is truncated')
+        metadata = json.loads(buf[blob_start:header_len].decode('utf-8'))
+        if salt_len:
+            metadata['salt'] = bytes(buf[6:6 + salt_len])
+        return metadata, header_len
+
     def upload_file(self, file_data: bytes, filename: str, metadata: dict = None) -> dict:
         """
         Upload encrypted file to S3
@@ -59,24 +140,18 @@ class AWSHandler:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             s3_key = f"encrypted/{timestamp}_{filename}"
             
-            # Prepare metadata for S3
-            s3_metadata = {}
-            if metadata:
-                # Convert metadata to strings (S3 only accepts string metadata)
-                for key, value in metadata.items():
-                    if isinstance(value, bytes):
-                        # Convert bytes to base64 string for storage
-                        import base64
-                        s3_metadata[key] = base64.b64encode(value).decode('utf-8')
-                    else:
-                        s3_metadata[key] = str(value)
-            
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=file_data,
-                Metadata=s3_metadata
+            # Metadata travels as a binary header at the start of the
+            # object body (see _pack_metadata), not as user metadata
+            body = self._pack_metadata(metadata) + file_data
+
+            # Upload to S3 - upload_fileobj hands payloads over the
+            # transfer config's threshold to boto3's transfer manager,
+            # which uploads 8 MB parts on 10 threads concurrently
+            self.s3_client.upload_fileobj(
+                io.BytesIO(body),
+                self.bucket_name,
+                s3_key,
+                Config=self.transfer_config
             )
             
             return {
@@ -105,46 +180,277 @@ class AWSHandler:
                 'message': f'Upload failed: {str(e)}'
             }
     
+    def upload_multipart(self, chunks, filename: str, metadata: dict = None) -> dict:
+        """
+        Upload a stream of encrypted chunks to S3 as a multipart upload
+
+        Consumes the chunk iterator as parts arrive, so the whole file
+        never has to sit in memory and upstream encryption can overlap
+        with the S3 transfer.
+
+        Args:
+            chunks: Iterable of encrypted byte chunks
+            filename: Name to save the file as
+            metadata: Optional metadata (like salt, original filename, etc.)
+
+        Returns:
+            dict: Upload status and file info
+        """
+        MIN_PART_SIZE = 5 * 1024 * 1024  # S3's minimum part size
+
+        # Generate a unique key for S3 (adds timestamp to avoid duplicates)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        s3_key = f"encrypted/{timestamp}_{filename}"
+
+        upload_id = None
+        try:
+            multipart = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key
+            )
+            upload_id = multipart['UploadId']
+
+            # Metadata travels as a binary header at the start of the
+            # object body (see _pack_metadata), not as user metadata
+            chunks = itertools.chain([self._pack_metadata(metadata)], chunks)
+
+            parts = []
+            buffer = bytearray()
+            total_size = 0
+
+            def upload_part(data):
+                part_number = len(parts) + 1
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data
+                )
+                parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+            # Buffer incoming chunks up to S3's minimum part size.
+            # Chunks that already meet it (the encryptor emits ~5 MB
+            # frames) are sent as-is - no copy into the buffer and no
+            # bytes() copy back out, saving two 5 MB memcpys per part
+            for chunk in chunks:
+                total_size += len(chunk)
+                if not buffer and len(chunk) >= MIN_PART_SIZE:
+                    upload_part(chunk)
+                    continue
+                buffer += chunk
+                if len(buffer) >= MIN_PART_SIZE:
+                    upload_part(buffer)
+                    buffer = bytearray()
+
+            # Final part may be smaller than the minimum (S3 allows this)
+            if buffer or not parts:
+                upload_part(buffer)
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+
+            return {
+                'success': True,
+                'message': 'File uploaded successfully',
+                's3_key': s3_key,
+                'bucket': self.bucket_name,
+                'size': total_size
+            }
+
+        except NoCredentialsError:
+            return {
+                'success': False,
+                'message': 'AWS credentials not found or invalid'
+            }
+
+        except ClientError as e:
+            self._abort_multipart(s3_key, upload_id)
+            return {
+                'success': False,
+                'message': f'AWS S3 error: {str(e)}'
+            }
+
+        except Exception as e:
+            self._abort_multipart(s3_key, upload_id)
+            return {
+                'success': False,
+                'message': f'Upload failed: {str(e)}'
+            }
+
+    def _abort_multipart(self, s3_key: str, upload_id: str) -> None:
+        """Abort a failed multipart upload so S3 doesn't keep orphaned parts"""
+        if upload_id:
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id
+                )
+            except Exception:
+                pass
+
+    @staticmethod
+    def _decode_metadata(metadata: dict) -> dict:
+        """Convert base64 metadata strings back to bytes where needed"""
+        processed_metadata = {}
+        for key, value in metadata.items():
+            if key == 'salt':  # We know salt should be bytes
+                processed_metadata[key] = base64.b64decode(value)
+            else:
+                processed_metadata[key] = value
+        return processed_metadata
+
+    def download_fileobj(self, s3_key: str, sink) -> dict:
+        """
+        Download an S3 object into a caller-supplied file-like sink
+
+        Uses the transfer manager, which fetches large objects as
+        concurrent ranged GETs directly into the sink, so nothing is
+        buffered in this process beyond the transfer chunks. The sink
+        can be an open file, a BytesIO, or any writable binary stream.
+
+        Args:
+            s3_key: The S3 key (path) of the file to download
+            sink: Writable binary file-like object to receive the data
+
+        Returns:
+            dict: Download status with metadata and size
+        """
+        try:
+            # Probe the object prefix: new-format objects start with
+            # the metadata header, legacy ones carry user metadata
+            probe = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Range='bytes=0-8191'
+            )
+            prefix = probe['Body'].read()
+            total_size = int(probe['ContentRange'].split('/')[-1])
+            parsed = self._parse_meta_header(prefix)
+
+            if parsed:
+                metadata, header_len = parsed
+                sink.write(prefix[header_len:])
+                if total_size > len(prefix):
+                    rest = self.s3_client.get_object(
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        Range=f'bytes={len(prefix)}-'
+                    )
+                    for chunk in rest['Body'].iter_chunks(65536):
+                        sink.write(chunk)
+                size = total_size - header_len
+            else:
+                # Legacy object: let the transfer manager fetch it as
+                # concurrent ranged GETs from the start
+                metadata = self._decode_metadata(probe.get('Metadata', {}))
+                self.s3_client.download_fileobj(
+                    self.bucket_name,
+                    s3_key,
+                    sink,
+                    Config=self.transfer_config
+                )
+                size = total_size
+
+            return {
+                'success': True,
+                'message': 'File downloaded successfully',
+                'metadata': metadata,
+                'size': size
+            }
+
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return {
+                    'success': False,
+                    'message': 'File not found in S3'
+                }
+            else:
+                return {
+                    'success': False,
+                    'message': f'AWS S3 error: {str(e)}'
+                }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Download failed: {str(e)}'
+            }
+
     def download_file(self, s3_key: str) -> dict:
         """
         Download encrypted file from S3
-        
+
         Args:
             s3_key: The S3 key (path) of the file to download
-        
+
         Returns:
             dict: File data and metadata
         """
+        sink = io.BytesIO()
+        result = self.download_fileobj(s3_key, sink)
+
+        if not result['success']:
+            return result
+
+        file_data = sink.getvalue()
+        return {
+            'success': True,
+            'message': 'File downloaded successfully',
+            'file_data': file_data,
+            'metadata': result['metadata'],
+            'size': len(file_data)
+        }
+
+
+    def download_stream(self, s3_key: str, chunk_size: int = 65536) -> dict:
+        """
+        Stream an encrypted file from S3 without buffering it in memory
+
+        Args:
+            s3_key: The S3 key (path) of the file to download
+            chunk_size: Size of each streamed chunk in bytes
+
+        Returns:
+            dict: Metadata plus a 'chunks' iterator over the object body
+        """
         try:
-            # Download from S3
             response = self.s3_client.get_object(
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
-            
-            # Read file data
-            file_data = response['Body'].read()
-            
-            # Get metadata
-            metadata = response.get('Metadata', {})
-            
-            # Convert base64 strings back to bytes if needed
-            import base64
-            processed_metadata = {}
-            for key, value in metadata.items():
-                if key == 'salt':  # We know salt should be bytes
-                    processed_metadata[key] = base64.b64decode(value)
-                else:
-                    processed_metadata[key] = value
-            
+            body = response['Body']
+            size = response.get('ContentLength', 0)
+
+            # Sniff for the metadata body-header; legacy objects keep
+            # their metadata in S3 user metadata instead
+            first = body.read(6)
+            if first[:4] == self._META_MAGIC:
+                salt_len = int.from_bytes(first[4:6], 'big')
+                salt = body.read(salt_len)
+                blob_len = int.from_bytes(body.read(4), 'big')
+                metadata = json.loads(body.read(blob_len).decode('utf-8'))
+                if salt:
+                    metadata['salt'] = salt
+                chunks = body.iter_chunks(chunk_size)
+                size -= 6 + salt_len + 4 + blob_len
+            else:
+                metadata = self._decode_metadata(response.get('Metadata', {}))
+                chunks = itertools.chain([first], body.iter_chunks(chunk_size))
+
             return {
                 'success': True,
-                'message': 'File downloaded successfully',
-                'file_data': file_data,
-                'metadata': processed_metadata,
-                'size': len(file_data)
+                'message': 'File stream opened successfully',
+                'chunks': chunks,
+                'metadata': metadata,
+                'size': size
             }
-        
+
         except ClientError as e:
             if e.response['Error']['Code'] == 'NoSuchKey':
                 return {
@@ -156,81 +462,184 @@ class AWSHandler:
                     'success': False,
                     'message': f'AWS S3 error: {str(e)}'
                 }
-        
+
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Download failed: {str(e)}'
             }
-    
+
+    def generate_download_url(self, s3_key: str, expires_in: int = 300) -> dict:
+        """
+        Generate a short-lived pre-signed GET URL for an S3 object
+
+        Lets the client fetch the (still encrypted) object directly from
+        S3 instead of proxying every byte through the Flask worker.
+
+        Args:
+            s3_key: The S3 key (path) of the file
+            expires_in: URL validity in seconds (keep this short)
+
+        Returns:
+            dict: Contains the pre-signed url and its expiry
+        """
+        try:
+            # Pre-signing never calls S3, so check the object exists
+            # first - otherwise we'd hand out URLs that 404
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+
+            url = self.s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': s3_key},
+                ExpiresIn=expires_in
+            )
+
+            return {
+                'success': True,
+                'message': 'Pre-signed URL generated',
+                'url': url,
+                'expires_in': expires_in
+            }
+
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return {
+                    'success': False,
+                    'message': 'File not found in S3'
+                }
+            else:
+                return {
+                    'success': False,
+                    'message': f'AWS S3 error: {str(e)}'
+                }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Failed to generate URL: {str(e)}'
+            }
+
+    def iter_files(self):
+        """
+        Lazily iterate over all files in the S3 bucket
+
+        list_objects_v2 returns at most 1000 keys per call, so the
+        paginator follows continuation tokens page by page. Yielding as
+        pages arrive lets callers stop early without listing the whole
+        bucket.
+
+        Yields:
+            dict: Info for each object under the encrypted/ prefix
+        """
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=self.bucket_name,
+            Prefix='encrypted/',
+            PaginationConfig={'PageSize': 1000}
+        )
+
+        for page in pages:
+            for obj in page.get('Contents', []):
+                yield {
+                    'key': obj['Key'],
+                    'size': obj['Size'],
+                    'last_modified': obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S'),
+                    'filename': obj['Key'].split('/')[-1]  # Get just the filename
+                }
+
     def list_files(self) -> dict:
         """
         List all files in the S3 bucket
-        
+
         Returns:
             dict: List of files with their info
         """
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix='encrypted/'
-            )
-            
-            if 'Contents' not in response:
+            files = list(self.iter_files())
+
+            if not files:
                 return {
                     'success': True,
                     'message': 'No files found',
                     'files': []
                 }
-            
-            files = []
-            for obj in response['Contents']:
-                files.append({
-                    'key': obj['Key'],
-                    'size': obj['Size'],
-                    'last_modified': obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S'),
-                    'filename': obj['Key'].split('/')[-1]  # Get just the filename
-                })
-            
+
             return {
                 'success': True,
                 'message': f'Found {len(files)} files',
                 'files': files
             }
-        
+
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Failed to list files: {str(e)}'
             }
     
-    def delete_file(self, s3_key: str) -> dict:
+    def delete_files(self, s3_keys: list) -> dict:
         """
-        Delete a file from S3
-        
+        Delete multiple files from S3 in batched requests
+
+        Uses delete_objects, which accepts up to 1000 keys per call, so
+        bulk cleanup costs one round-trip per 1000 objects instead of
+        one per object.
+
         Args:
-            s3_key: The S3 key of the file to delete
-        
+            s3_keys: List of S3 keys to delete
+
         Returns:
-            dict: Deletion status
+            dict: Deletion status with count of deleted objects
         """
         try:
-            self.s3_client.delete_object(
-                Bucket=self.bucket_name,
-                Key=s3_key
-            )
-            
+            errors = []
+            for start in range(0, len(s3_keys), 1000):
+                batch = s3_keys[start:start + 1000]
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={
+                        'Objects': [{'Key': key} for key in batch],
+                        'Quiet': True  # Only report failures back
+                    }
+                )
+                errors.extend(response.get('Errors', []))
+
+            if errors:
+                failed_keys = [error['Key'] for error in errors]
+                return {
+                    'success': False,
+                    'message': f'Failed to delete {len(failed_keys)} file(s): {", ".join(failed_keys[:5])}'
+                }
+
             return {
                 'success': True,
-                'message': 'File deleted successfully'
+                'message': f'Deleted {len(s3_keys)} file(s) successfully'
             }
-        
+
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Delete failed: {str(e)}'
             }
 
+    def delete_file(self, s3_key: str) -> dict:
+        """
+        Delete a file from S3
+
+        Args:
+            s3_key: The S3 key of the file to delete
+
+        Returns:
+            dict: Deletion status
+        """
+        result = self.delete_files([s3_key])
+
+        if result['success']:
+            return {
+                'success': True,
+                'message': 'File deleted successfully'
+            }
+        return result
+
 
 # Test function
 if __name__ == "__main__":
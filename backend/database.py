@@ -1,53 +1,178 @@
+import gzip
 import json
 import os
+import threading
 from datetime import datetime
+from time import monotonic
+
+# Optional fast JSON - orjson is several times faster than stdlib json,
+# which matters here because every read re-parses a whole file
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+    def _json_dumps_pretty(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+
+    def _json_dumps_line(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+
+    def _json_dumps_pretty(obj):
+        return json.dumps(obj, indent=2)
+
+    def _json_dumps_line(obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+# Short-lived in-process cache for file metadata reads
+# Hot files get re-fetched on every user's verification; serving repeat
+# reads from memory avoids re-parsing files.json each time
+# Shared across Database instances so write invalidation is seen by all
+_META_CACHE = {}
+_META_CACHE_LOCK = threading.Lock()
+_META_CACHE_TTL = 60    # seconds
+_META_CACHE_MAX = 4096  # Bound memory usage (FIFO eviction)
+
+# Parsed-file cache keyed by filepath, invalidated by mtime: repeat
+# reads of users.json/files.json cost a stat + dict lookup instead of a
+# full parse. Shared across Database instances like the metadata cache
+_FILE_CACHE = {}
+_FILE_CACHE_LOCK = threading.Lock()
+
+# Secondary email -> username index so login-by-email is O(1) instead
+# of scanning every user record; rebuilt whenever the cached users
+# object is replaced (i.e. the file changed)
+_EMAIL_INDEX = {}
+_EMAIL_INDEX_LOCK = threading.Lock()
+
+# Audit log settings: the log is append-only JSONL (one record per
+# line), so each event writes only its own bytes instead of rewriting
+# the whole file; the lock serializes appends and compaction
+_AUDIT_LOCK = threading.Lock()
+# Parsed audit records keyed by the file's (mtime_ns, size), so views
+# rendered back to back (summary + activity + report) share one
+# read+parse of the log instead of re-scanning it each
+_AUDIT_CACHE = {'key': None, 'logs': []}
+_AUDIT_KEEP = 1000                     # Entries kept after compaction
+_AUDIT_COMPACT_BYTES = 2 * 1024 * 1024  # Compact when file grows past this
+
 
 class Database:
     """
     Simple JSON-based database for CloudSentinel
     Stores users, files metadata, and audit logs
     """
-    
+
+    # Shared instance: every handler that does Database() gets the same
+    # object, so the path setup, existence checks, and audit-log handle
+    # happen once per process instead of once per construction
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __init__(self):
-        """Initialize database files"""
+        """Initialize database files (once per process)"""
+        if getattr(self, '_initialized', False):
+            return
         self.db_folder = 'database'
         self.users_file = os.path.join(self.db_folder, 'users.json')
         self.files_file = os.path.join(self.db_folder, 'files.json')
-        self.audit_file = os.path.join(self.db_folder, 'audit_log.json')
-        
+        self.audit_file = os.path.join(self.db_folder, 'audit_log.jsonl')
+
         # Create database folder if it doesn't exist
         if not os.path.exists(self.db_folder):
             os.makedirs(self.db_folder)
             print(f"✅ Created database folder: {self.db_folder}")
-        
+
         # Initialize database files if they don't exist
         self._init_file(self.users_file, {})
         self._init_file(self.files_file, {})
-        self._init_file(self.audit_file, [])
+        self._migrate_audit_log()
+
+        # Keep one append-mode handle open; O_APPEND writes always land
+        # at the current end of file, so handles in other instances stay
+        # valid across compactions
+        self._audit_fh = open(self.audit_file, 'a')
+        # Size at which the next compaction attempt triggers; advanced
+        # past the current size after each attempt so large entries
+        # can't make every append re-read the whole log
+        self._audit_compact_at = _AUDIT_COMPACT_BYTES
+        self._initialized = True
+
+    def _migrate_audit_log(self):
+        """One-time conversion of the legacy JSON-array audit log to JSONL"""
+        legacy_file = os.path.join(self.db_folder, 'audit_log.json')
+        if os.path.exists(legacy_file) and not os.path.exists(self.audit_file):
+            try:
+                with open(legacy_file, 'r') as f:
+                    entries = json.load(f)
+                with open(self.audit_file, 'w') as f:
+                    f.writelines(_json_dumps_line(entry) + '\n' for entry in entries[-_AUDIT_KEEP:])
+                os.remove(legacy_file)
+                print(f"✅ Migrated audit log to JSONL: {self.audit_file}")
+            except Exception as e:
+                print(f"❌ Error migrating audit log: {str(e)}")
     
     def _init_file(self, filepath, default_data):
         """Create a database file with default data if it doesn't exist"""
         if not os.path.exists(filepath):
             with open(filepath, 'w') as f:
-                json.dump(default_data, f, indent=2)
+                f.write(_json_dumps_pretty(default_data))
             print(f"✅ Created database file: {filepath}")
-    
+
     def _read_json(self, filepath):
-        """Read data from a JSON file"""
+        """Read data from a JSON file (cached until the file's mtime changes)"""
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
+            mtime = os.stat(filepath).st_mtime_ns
+            with _FILE_CACHE_LOCK:
+                cached = _FILE_CACHE.get(filepath)
+                if cached and cached[0] == mtime:
+                    return cached[1]
+
+            with open(filepath, 'rb') as f:
+                data = _json_loads(f.read())
+
+            with _FILE_CACHE_LOCK:
+                _FILE_CACHE[filepath] = (mtime, data)
+            return data
         except Exception as e:
             print(f"❌ Error reading {filepath}: {str(e)}")
-            return {} if filepath != self.audit_file else []
-    
+            return {}
+
     def _write_json(self, filepath, data):
-        """Write data to a JSON file"""
+        """Write data to a JSON file (pretty-printed; these files are
+        written rarely and humans do read them)"""
         try:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Serialize before touching the file: a bad value must fail
+            # here, while the old contents are still intact on disk.
+            # Writing a sibling temp file and renaming it over the
+            # target makes the swap atomic, so a crash mid-write can
+            # never leave a truncated store either
+            serialized = _json_dumps_pretty(data)
+            tmp_path = filepath + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(serialized)
+            os.replace(tmp_path, filepath)
+            # Seed the cache with what we just wrote - no re-parse needed
+            mtime = os.stat(filepath).st_mtime_ns
+            with _FILE_CACHE_LOCK:
+                _FILE_CACHE[filepath] = (mtime, data)
             return True
         except Exception as e:
+            # Don't leave a possibly-mutated object cached against a
+            # file we failed to update
+            with _FILE_CACHE_LOCK:
+                _FILE_CACHE.pop(filepath, None)
             print(f"❌ Error writing {filepath}: {str(e)}")
             return False
     
@@ -74,6 +199,10 @@ class Database:
             'role': 'user'  # Can be 'user' or 'admin'
         }
         
+        # The users object is mutated in place, so identity-based index
+        # reuse won't notice - invalidate explicitly
+        self._invalidate_email_index()
+
         if self._write_json(self.users_file, users):
             return {'success': True, 'message': 'User created successfully'}
         else:
@@ -84,13 +213,27 @@ class Database:
         users = self._read_json(self.users_file)
         return users.get(username)
     
+    def _invalidate_email_index(self):
+        """Drop the email index after a user write"""
+        with _EMAIL_INDEX_LOCK:
+            _EMAIL_INDEX.pop(self.users_file, None)
+
     def get_user_by_email(self, email):
-        """Get user by email"""
+        """Get user by email (O(1) via the email index)"""
         users = self._read_json(self.users_file)
-        for username, user_data in users.items():
-            if user_data['email'] == email:
-                return {**user_data, 'username': username}
-        return None
+
+        with _EMAIL_INDEX_LOCK:
+            cached = _EMAIL_INDEX.get(self.users_file)
+            if cached is None or cached[0] is not users:
+                index = {data['email']: name for name, data in users.items()}
+                _EMAIL_INDEX[self.users_file] = (users, index)
+            else:
+                index = cached[1]
+
+        username = index.get(email)
+        if username is None:
+            return None
+        return {**users[username], 'username': username}
     
     def list_users(self):
         """List all users (excluding password hashes)"""
@@ -113,14 +256,20 @@ class Database:
         files[file_id] = {
             'owner': owner,
             'original_filename': original_filename,
+            # Persisted so listing/deletion run purely off local
+            # metadata - no S3 prefix scan to reconstruct keys
+            's3_key': metadata.get('s3_key', file_id),
             'uploaded_at': datetime.now().isoformat(),
             'allowed_users': [owner],  # Owner always has access
             'access_start_time': metadata.get('access_start_time', '09:00'),
             'access_end_time': metadata.get('access_end_time', '18:00'),
             'allowed_regions': metadata.get('allowed_regions', ['IN', 'US', 'GB']),
+            'content_key': metadata.get('content_key'),  # For upload dedup
             'encryption_metadata': metadata.get('encryption_metadata', {})
         }
         
+        self._invalidate_meta_cache(file_id)
+
         if self._write_json(self.files_file, files):
             return {'success': True, 'message': 'File metadata saved'}
         else:
@@ -128,9 +277,57 @@ class Database:
     
     def get_file_metadata(self, file_id):
         """Get file metadata"""
+        # Serve repeat reads of hot files from the in-process cache
+        with _META_CACHE_LOCK:
+            cached = _META_CACHE.get(file_id)
+            if cached and cached[0] > monotonic():
+                # Return a copy so callers can't mutate the cached entry
+                return dict(cached[1])
+
+        files = self._read_json(self.files_file)
+        metadata = files.get(file_id)
+
+        if metadata is not None:
+            with _META_CACHE_LOCK:
+                while len(_META_CACHE) >= _META_CACHE_MAX:
+                    _META_CACHE.pop(next(iter(_META_CACHE)))
+                _META_CACHE[file_id] = (monotonic() + _META_CACHE_TTL, metadata)
+            return dict(metadata)
+
+        return metadata
+
+    @staticmethod
+    def _invalidate_meta_cache(file_id):
+        """Drop a file's cached metadata after a write"""
+        with _META_CACHE_LOCK:
+            _META_CACHE.pop(file_id, None)
+
+    def get_file_metadata_batch(self, file_ids):
+        """Get metadata for multiple files in a single read
+
+        Returns a {file_id: metadata} dict for O(1) lookup;
+        unknown file_ids are simply absent from the result. Each value
+        is a copy (like get_file_metadata) so callers can't mutate the
+        shared parsed-file cache.
+        """
         files = self._read_json(self.files_file)
-        return files.get(file_id)
+        return {file_id: dict(files[file_id]) for file_id in file_ids if file_id in files}
     
+    def find_file_by_content_key(self, content_key, owner=None):
+        """Find a file by its content hash (optionally scoped to an owner)
+
+        Returns (file_id, metadata) for the first match, or None.
+        Used to short-circuit duplicate uploads of identical content.
+        """
+        files = self._read_json(self.files_file)
+        for file_id, metadata in files.items():
+            if metadata.get('content_key') != content_key:
+                continue
+            if owner is not None and metadata['owner'] != owner:
+                continue
+            return file_id, metadata
+        return None
+
     def update_file_access(self, file_id, allowed_users=None, access_times=None, allowed_regions=None):
         """Update file access control settings"""
         files = self._read_json(self.files_file)
@@ -148,6 +345,8 @@ class Database:
         if allowed_regions is not None:
             files[file_id]['allowed_regions'] = allowed_regions
         
+        self._invalidate_meta_cache(file_id)
+
         if self._write_json(self.files_file, files):
             return {'success': True, 'message': 'Access control updated'}
         else:
@@ -179,7 +378,9 @@ class Database:
             return {'success': False, 'message': 'File not found'}
         
         del files[file_id]
-        
+
+        self._invalidate_meta_cache(file_id)
+
         if self._write_json(self.files_file, files):
             return {'success': True, 'message': 'File metadata deleted'}
         else:
@@ -187,10 +388,64 @@ class Database:
     
     # ==================== AUDIT LOG OPERATIONS ====================
     
+    def _append_audit_lines(self, lines):
+        """Append serialized records to the log, compacting when it grows"""
+        with _AUDIT_LOCK:
+            self._audit_fh.write(''.join(lines))
+            self._audit_fh.flush()
+            if self._audit_fh.tell() > self._audit_compact_at:
+                self._compact_audit_log()
+
+    def _compact_audit_log(self):
+        """Rewrite the log keeping only recent entries (caller holds lock)
+
+        Entries trimmed from the online log are appended to a gzipped
+        per-day archive first, so compaction bounds the hot file without
+        losing history. Truncates in place (same inode) so append
+        handles held by other Database instances keep working.
+        """
+        try:
+            with open(self.audit_file, 'r') as f:
+                lines = f.readlines()
+
+            if len(lines) > _AUDIT_KEEP:
+                self._archive_audit_lines(lines[:-_AUDIT_KEEP])
+                with open(self.audit_file, 'w') as f:
+                    f.writelines(lines[-_AUDIT_KEEP:])
+                self._audit_fh.seek(0, os.SEEK_END)
+            # Either way, don't try again until the file has grown a
+            # full compaction interval past its current size - when the
+            # most-recent _AUDIT_KEEP entries alone exceed the byte
+            # threshold (large details payloads), a fixed trigger would
+            # re-read the whole log on every subsequent append
+            self._audit_compact_at = self._audit_fh.tell() + _AUDIT_COMPACT_BYTES
+        except Exception as e:
+            print(f"❌ Error compacting audit log: {str(e)}")
+
+    def _archive_audit_lines(self, lines):
+        """Append trimmed log lines to today's compressed archive file
+
+        Archives live under database/audit_archive/ as one gzipped
+        JSONL file per day (JSONL compresses ~10x), small enough to
+        keep locally or sync to S3 out of band. Archival failure never
+        blocks compaction - the online log matters more.
+        """
+        if not lines:
+            return
+        try:
+            archive_dir = os.path.join(self.db_folder, 'audit_archive')
+            os.makedirs(archive_dir, exist_ok=True)
+            archive_file = os.path.join(
+                archive_dir,
+                f"{datetime.now().strftime('%Y-%m-%d')}.jsonl.gz"
+            )
+            with gzip.open(archive_file, 'at') as f:
+                f.writelines(lines)
+        except Exception as e:
+            print(f"❌ Error archiving audit log entries: {str(e)}")
+
     def log_event(self, event_type, username, file_id=None, details=None, ip_address=None, success=True):
         """Log an event to the audit log"""
-        audit_logs = self._read_json(self.audit_file)
-        
         log_entry = {
             'timestamp': datetime.now().isoformat(),
             'event_type': event_type,  # e.g., 'LOGIN', 'UPLOAD', 'DOWNLOAD', 'ACCESS_DENIED'
@@ -200,30 +455,72 @@ class Database:
             'success': success,
             'details': details or {}
         }
-        
-        audit_logs.append(log_entry)
-        
-        # Keep only last 1000 logs to prevent file from growing too large
-        if len(audit_logs) > 1000:
-            audit_logs = audit_logs[-1000:]
-        
-        self._write_json(self.audit_file, audit_logs)
-    
+
+        self._append_audit_lines([_json_dumps_line(log_entry) + '\n'])
+
+    def log_events_bulk(self, entries):
+        """Append multiple pre-built audit entries in a single write"""
+        self._append_audit_lines([_json_dumps_line(entry) + '\n' for entry in entries])
+
+    def _load_audit_logs(self):
+        """Read and parse the whole audit log, cached on file state
+
+        Returns the records oldest-first. The cached list is shared
+        between callers, so treat it as read-only.
+        """
+        try:
+            stat = os.stat(self.audit_file)
+            cache_key = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return []
+
+        with _AUDIT_LOCK:
+            if _AUDIT_CACHE['key'] == cache_key:
+                return _AUDIT_CACHE['logs']
+
+        try:
+            with open(self.audit_file, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+
+        logs = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                logs.append(_json_loads(line))
+            except ValueError:
+                continue  # Skip a torn/corrupt line rather than failing the query
+
+        with _AUDIT_LOCK:
+            _AUDIT_CACHE['key'] = cache_key
+            _AUDIT_CACHE['logs'] = logs
+        return logs
+
+    def iter_audit_logs(self):
+        """Iterate over all audit records, oldest first"""
+        return iter(self._load_audit_logs())
+
     def get_audit_logs(self, username=None, file_id=None, limit=50):
-        """Get audit logs with optional filters"""
-        audit_logs = self._read_json(self.audit_file)
-        
-        # Filter logs
-        filtered_logs = audit_logs
-        
-        if username:
-            filtered_logs = [log for log in filtered_logs if log['username'] == username]
-        
-        if file_id:
-            filtered_logs = [log for log in filtered_logs if log['file_id'] == file_id]
-        
-        # Return most recent logs
-        return filtered_logs[-limit:][::-1]  # Reverse to get newest first
+        """Get audit logs with optional filters (newest first)
+
+        Filters in memory over the shared parsed log, walking backwards
+        so the scan stops as soon as `limit` matching records are found.
+        """
+        matches = []
+        for log in reversed(self._load_audit_logs()):
+            if username and log['username'] != username:
+                continue
+            if file_id and log['file_id'] != file_id:
+                continue
+
+            matches.append(log)
+            if len(matches) >= limit:
+                break
+
+        return matches
 
 
 # Test the database
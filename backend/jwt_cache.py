@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from time import monotonic, time
+
+from flask_jwt_extended import jwt_manager as _jwt_manager
+from jwt import ExpiredSignatureError
+
+# TTL cache for verified JWT claims
+# Every @jwt_required() endpoint re-verifies the token signature on every
+# request, even when one token drives a burst of calls from the UI
+# (list files, audit views, user info). Caching the decoded claims for a
+# short window skips the repeat HMAC verification and JSON parsing.
+# Keys are token hashes so raw tokens are never held in the cache.
+_JWT_CACHE = {}
+_JWT_CACHE_LOCK = threading.Lock()
+_JWT_CACHE_TTL = 30     # Never trust a cached verification longer than this
+_JWT_CACHE_MAX = 10000  # Bound memory usage (FIFO eviction)
+
+_original_decode = _jwt_manager._decode_jwt
+
+
+def _cached_decode_jwt(**kwargs):
+    """Decode a JWT, serving repeat verifications of the same token from cache"""
+    encoded_token = kwargs.get('encoded_token')
+
+    # Only the plain verification path is cached; CSRF-paired and
+    # expired-token decodes go straight through
+    cacheable = (encoded_token is not None
+                 and not kwargs.get('csrf_value')
+                 and not kwargs.get('allow_expired'))
+
+    if not cacheable:
+        return _original_decode(**kwargs)
+
+    token_hash = hashlib.sha256(encoded_token.encode('utf-8')).digest()[:16]
+
+    with _JWT_CACHE_LOCK:
+        cached = _JWT_CACHE.get(token_hash)
+        if cached and cached[0] > monotonic():
+            claims = cached[1]
+            # Expiry is always re-checked, even on a cache hit
+            if 'exp' in claims and claims['exp'] <= time():
+                _JWT_CACHE.pop(token_hash, None)
+                raise ExpiredSignatureError('Signature has expired')
+            return dict(claims)
+
+    claims = _original_decode(**kwargs)
+
+    # Cache until the token expires, capped at the short TTL
+    ttl = _JWT_CACHE_TTL
+    if 'exp' in claims:
+        ttl = min(ttl, claims['exp'] - time())
+
+    if ttl > 0:
+        with _JWT_CACHE_LOCK:
+            while len(_JWT_CACHE) >= _JWT_CACHE_MAX:
+                _JWT_CACHE.pop(next(iter(_JWT_CACHE)))
+            _JWT_CACHE[token_hash] = (monotonic() + ttl, dict(claims))
+
+    return claims
+
+
+def install_jwt_cache():
+    """Route flask_jwt_extended's token decoding through the TTL cache"""
+    _jwt_manager._decode_jwt = _cached_decode_jwt
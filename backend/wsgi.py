@@ -0,0 +1,13 @@
+"""
+Production WSGI entrypoint for CloudSentinel
+
+Run with gevent workers so S3 round-trips don't pin a worker each:
+
+    gunicorn -k gevent -w 4 --worker-connections 1000 wsgi:app
+
+The dev server in app.py stays for local development only.
+"""
+from app import app
+
+if __name__ == "__main__":
+    app.run()